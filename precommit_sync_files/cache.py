@@ -0,0 +1,116 @@
+"""On-disk caches shared across hook invocations."""
+
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking
+    fcntl = None
+
+# Source checkouts not used for this long are pruned. Each hook upgrade pins a
+# new tag and so a new entry, leaving the previous one unused.
+SOURCE_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def get_cache_dir() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'precommit-sync-files'
+
+
+def source_cache_dir(repo_url: str, ref: str, paths: Sequence[str]) -> Path:
+    """Cache directory for one source checkout; paths are part of the key
+    because sparse and archive fetches only contain the requested files."""
+    key = '\0'.join([repo_url, ref, *sorted(paths)])
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return get_cache_dir() / 'sources' / digest
+
+
+@contextmanager
+def file_lock(lock_path: Path, blocking: bool = True) -> Iterator[None]:
+    """
+    Hold an exclusive flock on lock_path to serialize concurrent hook runs.
+
+    With blocking=False, raises BlockingIOError if the lock is already held.
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        lock_file = open(lock_path, 'a')
+        if fcntl is None or _acquire(lock_file, lock_path, blocking):
+            break
+        # The lock file was pruned while we waited; lock the new one instead
+        lock_file.close()
+
+    with lock_file:
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _acquire(lock_file: IO[str], lock_path: Path, blocking: bool) -> bool:
+    """flock lock_file; False if lock_path no longer names the locked file."""
+    try:
+        fcntl.flock(
+            lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        )
+        try:
+            return os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+    except BaseException:
+        lock_file.close()
+        raise
+
+
+def _last_used(work_dir: Path) -> float:
+    # The .complete marker is touched on every use; fall back to the entry
+    # itself (or its lock) for incomplete or orphaned entries
+    for path in (work_dir / '.complete', work_dir, work_dir.with_suffix('.lock')):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            pass
+    return 0.0
+
+
+def prune_source_cache(
+    keep: Optional[Path] = None, max_age: float = SOURCE_CACHE_MAX_AGE
+) -> None:
+    """
+    Remove source checkouts, and their lock files, unused for max_age seconds.
+
+    Best-effort: entries locked by a running hook are skipped and errors are
+    ignored. Without fcntl (Windows) nothing is pruned, since entries in use
+    can't be detected.
+    """
+    if fcntl is None:
+        return
+
+    sources_dir = get_cache_dir() / 'sources'
+    try:
+        names = os.listdir(sources_dir)
+    except OSError:
+        return
+
+    cutoff = time.time() - max_age
+    for key in sorted({name.removesuffix('.lock') for name in names}):
+        work_dir = sources_dir / key
+        if work_dir == keep or _last_used(work_dir) >= cutoff:
+            continue
+        lock_path = work_dir.with_suffix('.lock')
+        try:
+            with file_lock(lock_path, blocking=False):
+                # Another run may have used the entry before we got the lock
+                if _last_used(work_dir) >= cutoff:
+                    continue
+                shutil.rmtree(work_dir, ignore_errors=True)
+                os.unlink(lock_path)
+        except OSError:
+            continue
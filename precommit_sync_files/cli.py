@@ -1,50 +1,61 @@
+import logging
 import sys
 
-from precommit_sync_files.exceptions import (
-    ConfigError,
-    FileComparisonError,
-    SourceFetchError,
-    SyncError,
-)
-from precommit_sync_files.sync import sync_files
 from precommit_sync_files.log import get_logger
 from precommit_sync_files import __version__
 
+logger = get_logger(__name__, False)
+
 
 def main() -> int:
     # Parse arguments
     write_mode = '--write' in sys.argv[1:]
     debug_mode = '--debug' in sys.argv[1:]
 
-    logger = get_logger(__name__, debug_mode)
+    logger.setLevel(logging.DEBUG if debug_mode else logging.INFO)
     logger.info('Starting precommit-sync-files')
-    logger.info(f'Version: {__version__}')
+    logger.info('Version: %s', __version__)
+
+    # Missing config is a no-op (per design doc); check for it before
+    # importing the sync engine and its dependencies
+    from precommit_sync_files.config import find_config_file, load_config
+
+    config_path = find_config_file()
+    if config_path is None:
+        return 0
+
+    from precommit_sync_files.exceptions import (
+        ConfigError,
+        FileComparisonError,
+        SourceFetchError,
+        SyncError,
+    )
 
     try:
         # Load configuration
-        from precommit_sync_files.sync import load_config
-
-        config = load_config()
+        config = load_config(config_path)
     except ConfigError as e:
-        # Missing config is a no-op (per design doc)
+        # Config removed since it was found: still a no-op
         if '.sync-files.toml not found' in str(e):
             return 0
-        logger.error(f'Configuration error: {e}')
+        logger.error('Configuration error: %s', e)
         return 1
 
+    from precommit_sync_files.sync import sync_files
+
     try:
         # Perform sync
         errors, warnings = sync_files(config, write_mode=write_mode)
 
         # Print warnings
         for warning in warnings:
-            logger.warning(f'Warning: {warning}')
+            logger.warning('Warning: %s', warning)
 
         # Print errors and exit
         if errors:
             logger.error('File synchronization check failed:')
             for error in errors:
-                logger.error(f'  - {error}')
+                logger.error('  - %s', error)
             if not write_mode:
                 logger.error('Run with --write to automatically sync files.')
             return 1
@@ -53,15 +64,15 @@ def main() -> int:
             # In write mode, warnings indicate successful syncs
             logger.warning('Files synchronized successfully:')
             for warning in warnings:
-                logger.warning(f'  - {warning}')
+                logger.warning('  - %s', warning)
 
         return 0
 
     except (SourceFetchError, FileComparisonError, SyncError) as e:
-        logger.error(f'Sync error: {e}')
+        logger.error('Sync error: %s', e)
         return 1
     except Exception as e:
-        logger.error(f'Unexpected error: {e}')
+        logger.error('Unexpected error: %s', e)
         import traceback
 
         traceback.print_exc()
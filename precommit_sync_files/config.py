@@ -0,0 +1,177 @@
+"""Locate, load and validate .sync-files.toml.
+
+Kept free of heavy imports so the CLI can detect a missing config (the
+common no-op case) without loading the sync engine.
+"""
+
+import copy
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from precommit_sync_files.exceptions import ConfigError
+
+# Errors from os.stat that Path.exists() treats as "does not exist"
+MISSING_FILE_ERRORS = (FileNotFoundError, NotADirectoryError)
+
+_VALID_MODES = frozenset(('check', 'write'))
+_VALID_HASHES = frozenset(('blake3', 'sha256'))
+
+# Validated configs parsed in this process, keyed by (path, mtime_ns, size)
+_CONFIG_CACHE: Dict[Tuple[str, int, int], Dict] = {}
+
+
+def load_config(config_path: Optional[Path] = None) -> Dict:
+    if config_path is None:
+        config_path = find_config_file()
+
+    if config_path is None:
+        raise ConfigError(
+            '.sync-files.toml not found. The hook is a no-op if config is missing.'
+        )
+
+    try:
+        st = config_path.stat()
+    except MISSING_FILE_ERRORS:
+        raise ConfigError(
+            '.sync-files.toml not found. The hook is a no-op if config is missing.'
+        ) from None
+
+    # Reuse the validated config if this process already parsed the unchanged
+    # file. Callers get their own copy since the ref is mutated below.
+    cache_key = (str(config_path), st.st_mtime_ns, st.st_size)
+    config = _CONFIG_CACHE.get(cache_key)
+    if config is None:
+        config = _parse_config(config_path)
+        _CONFIG_CACHE[cache_key] = config
+    config = copy.deepcopy(config)
+
+    # When running as a pre-commit hook, override the ref with the hook's own version
+    # This ensures files are fetched from the same tag/version as the hook itself
+    hook_version = get_hook_version()
+    if hook_version is not None:
+        config['source']['ref'] = hook_version
+
+    return config
+
+
+def _parse_config(config_path: Path) -> Dict:
+    import tomllib
+
+    try:
+        with open(config_path, 'rb') as f:
+            config = tomllib.load(f)
+    except ValueError as e:
+        # tomllib raises ValueError for TOML decode errors
+        raise ConfigError(f'Failed to parse .sync-files.toml: {e}') from e
+    except Exception as e:
+        raise ConfigError(f'Failed to read .sync-files.toml: {e}') from e
+
+    return _validate(config)
+
+
+def _validate(config: Dict) -> Dict:
+    """Check required fields and fill in option defaults, failing fast."""
+    if not isinstance(config, dict):
+        raise ConfigError('Configuration must be a TOML table')
+
+    source = config.get('source')
+    if source is None:
+        raise ConfigError('Missing required field: source')
+    if not isinstance(source, dict):
+        raise ConfigError("Field 'source' must be a dictionary")
+    for key in ('repo', 'ref'):
+        if key not in source:
+            raise ConfigError(f'Missing required field: source.{key}')
+        if not isinstance(source[key], str):
+            raise ConfigError(f"Field 'source.{key}' must be a string")
+
+    files = config.get('files')
+    if files is None:
+        raise ConfigError('Missing required field: files')
+    if not isinstance(files, list):
+        raise ConfigError("Field 'files' must be a list")
+    if not files:
+        raise ConfigError("Field 'files' must contain at least one file mapping")
+
+    for i, file_entry in enumerate(files):
+        if not isinstance(file_entry, dict):
+            raise ConfigError(f'files[{i}] must be a dictionary')
+        for key in ('src', 'dst'):
+            if key not in file_entry:
+                raise ConfigError(f'files[{i}] missing required field: {key}')
+            if not isinstance(file_entry[key], str):
+                raise ConfigError(f"Field 'files[{i}].{key}' must be a string")
+
+    # Set default options
+    options = config.setdefault('options', {})
+    if not isinstance(options, dict):
+        raise ConfigError("Field 'options' must be a dictionary")
+    mode = options.setdefault('mode', 'check')
+
+    # isinstance first: TOML arrays/tables are unhashable for the set lookup
+    if not isinstance(mode, str) or mode not in _VALID_MODES:
+        raise ConfigError("options.mode must be 'check' or 'write'")
+
+    hash_name = options.get('hash')
+    if hash_name is not None and (
+        not isinstance(hash_name, str) or hash_name not in _VALID_HASHES
+    ):
+        raise ConfigError("options.hash must be 'blake3' or 'sha256'")
+
+    return config
+
+
+def find_config_file() -> Optional[Path]:
+    return _find_config_file(os.getcwd())
+
+
+@lru_cache(maxsize=None)
+def _find_config_file(start: str) -> Optional[Path]:
+    # Plain string ops and one stat per level; a Path is only built on a hit.
+    # Cached per start directory since the tree doesn't change within a run.
+    current = start
+    while True:
+        config_path = os.path.join(current, '.sync-files.toml')
+        # isfile is one stat that also skips a directory with this name
+        if os.path.isfile(config_path):
+            return Path(config_path)
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+@lru_cache(maxsize=1)
+def get_hook_version() -> Optional[str]:
+    try:
+        # Get the directory where this module is located
+        module_file = Path(__file__).resolve()
+        module_path_str = str(module_file)
+
+        # Check if we're in a pre-commit cache directory
+        # Pre-commit cache paths typically contain ".cache/pre-commit"
+        if '.cache/pre-commit' not in module_path_str:
+            return None
+
+        # Find the repository root by walking up from the module file
+        # Pre-commit cache structure:
+        # ~/.cache/pre-commit/<repohash>/<repohash>/ (the actual repo checkout)
+        # or
+        # ~/.cache/pre-commit/<repohash>/py_env-*/lib/python*/site-packages/ (if installed as package)
+        from precommit_sync_files.git_repo import GitRepository
+
+        git_repo = GitRepository()
+        repo_root = git_repo.find_repo_root(module_file.parent)
+
+        if repo_root is None:
+            return None
+
+        # Get version using GitRepository
+        return git_repo.get_version(repo_root)
+    except Exception:
+        # If anything goes wrong, return None (fall back to config file ref)
+        pass
+
+    return None
@@ -1,100 +1,99 @@
+import os
+import re
+import shutil
 import subprocess
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 
 from precommit_sync_files.exceptions import SourceFetchError
 
+# Refs that look like (possibly abbreviated) commit SHAs; only full 40-hex
+# SHAs are known not to be branch names
+COMMIT_SHA_RE = re.compile(r'[0-9a-f]{7,40}')
+
 
 class GitRepository:
     """Encapsulates git operations for repository management."""
 
     def __init__(self, work_dir: Optional[Path] = None):
         self.work_dir = work_dir
+        self._version_cache: Dict[Path, Optional[str]] = {}
 
-    def _run_git_command(
-        self, args: List[str], cwd: Optional[Path] = None, check: bool = True
-    ) -> subprocess.CompletedProcess:
+    def _run_git_check_output(
+        self, args: List[str], cwd: Optional[Path] = None
+    ) -> Optional[str]:
+        """Run a read-only git query; return stdout, or None if git failed."""
         if cwd is None:
             cwd = self.work_dir
 
-        return subprocess.run(
+        # stderr is never shown for queries, so don't pipe it
+        result = subprocess.run(
             args,
             cwd=cwd,
-            check=check,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             text=True,
         )
+        if result.returncode != 0:
+            return None
+        return result.stdout
 
-    def find_repo_root(self, start_path: Path, max_depth: int = 15) -> Optional[Path]:
-        current = start_path
-        depth = 0
+    def _run_git_noisy(self, args: List[str], cwd: Optional[Path] = None) -> None:
+        """Run a git command for its side effects, keeping stderr for errors."""
+        if cwd is None:
+            cwd = self.work_dir
 
-        while current != current.parent and depth < max_depth:
-            git_dir = current / '.git'
-            if git_dir.exists():
-                return current
-            current = current.parent
-            depth += 1
+        subprocess.run(
+            args,
+            cwd=cwd,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
 
-        return None
+    def find_repo_root(self, start_path: Path, max_depth: int = 15) -> Optional[Path]:
+        current = os.fspath(start_path)
 
-    def get_exact_tag_at_head(self, repo_path: Path) -> Optional[str]:
-        try:
-            result = self._run_git_command(
-                ['git', 'describe', '--tags', '--exact-match', 'HEAD'],
-                cwd=repo_path,
-                check=False,
-            )
-            if result.returncode == 0:
-                tag = result.stdout.strip()
-                if tag:
-                    return tag
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
-        return None
+        for _depth in range(max_depth):
+            # .git may be a file for worktrees and submodules
+            if os.path.exists(os.path.join(current, '.git')):
+                return Path(current)
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
 
-    def get_nearest_tag_at_head(self, repo_path: Path) -> Optional[str]:
-        try:
-            result = self._run_git_command(
-                ['git', 'describe', '--tags', '--abbrev=0', 'HEAD'],
-                cwd=repo_path,
-                check=False,
-            )
-            if result.returncode == 0:
-                tag = result.stdout.strip()
-                if tag:
-                    return tag
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
         return None
 
-    def get_commit_sha(self, repo_path: Path, ref: str = 'HEAD') -> Optional[str]:
+    def get_nearest_tag_at_head(self, repo_path: Path) -> Optional[str]:
         try:
-            result = self._run_git_command(
-                ['git', 'rev-parse', ref],
+            # --long always yields <tag>-<N>-g<sha>; --always yields a bare
+            # SHA instead of failing when no tag is reachable
+            output = self._run_git_check_output(
+                ['git', 'describe', '--tags', '--always', '--long', 'HEAD'],
                 cwd=repo_path,
-                check=False,
             )
-            if result.returncode == 0:
-                commit_sha = result.stdout.strip()
-                if commit_sha:
-                    return commit_sha
-        except (subprocess.CalledProcessError, FileNotFoundError):
+            if output:
+                parts = output.strip().rsplit('-', 2)
+                if len(parts) == 3 and parts[1].isdigit() and parts[2].startswith('g'):
+                    return parts[0]
+        except FileNotFoundError:
             pass
         return None
 
-    def get_tags_at_commit(self, repo_path: Path, commit_sha: str) -> List[str]:
+    def get_head_tags(self, repo_path: Path) -> List[str]:
+        """Tags pointing at HEAD, read from a single `git log` decoration."""
         try:
-            result = self._run_git_command(
-                ['git', 'tag', '--points-at', commit_sha],
+            output = self._run_git_check_output(
+                ['git', 'log', '-1', '--decorate=short', '--format=%D', 'HEAD'],
                 cwd=repo_path,
-                check=False,
             )
-            if result.returncode == 0:
-                tags = result.stdout.strip().split('\n')
-                # Filter out empty strings
-                return [tag for tag in tags if tag]
-        except (subprocess.CalledProcessError, FileNotFoundError):
+            if output is not None:
+                # e.g. "HEAD -> main, tag: v1.2.3, tag: v1.2, origin/main"
+                refs = output.strip().split(', ')
+                return [ref[len('tag: ') :] for ref in refs if ref.startswith('tag: ')]
+        except FileNotFoundError:
             pass
         return []
 
@@ -103,38 +102,36 @@ class GitRepository:
         Get version using fallback strategy.
 
         Tries in order:
-        1. Exact tag at HEAD
+        1. Tags at HEAD (preferring tags starting with 'v'), in one git call
         2. Nearest tag at HEAD
-        3. Tags at commit SHA (preferring tags starting with 'v')
+
+        Results are memoized per repo_path for the lifetime of this object.
         """
-        # First, try to get the exact tag at HEAD
-        tag = self.get_exact_tag_at_head(repo_path)
-        if tag:
-            return tag
-
-        # If that fails, try to get the nearest tag
-        tag = self.get_nearest_tag_at_head(repo_path)
-        if tag:
-            return tag
-
-        # As a last resort, check what ref HEAD points to
-        commit_sha = self.get_commit_sha(repo_path, 'HEAD')
-        if commit_sha:
-            tags = self.get_tags_at_commit(repo_path, commit_sha)
-            if tags:
-                # Return the first tag (prefer version tags starting with 'v')
-                for tag in tags:
-                    if tag.startswith('v'):
-                        return tag
-                return tags[0]
+        if repo_path not in self._version_cache:
+            self._version_cache[repo_path] = self._resolve_version(repo_path)
+        return self._version_cache[repo_path]
 
-        return None
+    def _resolve_version(self, repo_path: Path) -> Optional[str]:
+        tags = self.get_head_tags(repo_path)
+        if tags:
+            for tag in tags:
+                if tag.startswith('v'):
+                    return tag
+            return tags[0]
+
+        return self.get_nearest_tag_at_head(repo_path)
 
-    def clone_with_branch(self, repo_url: str, ref: str, target_dir: Path) -> None:
-        self._run_git_command(
+    def clone_with_branch(
+        self, repo_url: str, ref: str, target_dir: Path, quiet: bool = True
+    ) -> None:
+        # Blobs are fetched lazily at checkout; tags other than ref are skipped
+        self._run_git_noisy(
             [
                 'git',
                 'clone',
+                *_quiet_flag(quiet),
+                '--filter=blob:none',
+                '--no-tags',
                 '--depth',
                 '1',
                 '--branch',
@@ -142,65 +139,257 @@ class GitRepository:
                 repo_url,
                 str(target_dir),
             ],
-            check=True,
         )
 
-    def clone_shallow(self, repo_url: str, target_dir: Path) -> None:
-        self._run_git_command(
+    def clone_shallow(
+        self, repo_url: str, target_dir: Path, quiet: bool = True
+    ) -> None:
+        # Every branch tip is fetched here, so skip blobs until checkout needs them
+        self._run_git_noisy(
             [
                 'git',
                 'clone',
+                *_quiet_flag(quiet),
+                '--filter=blob:none',
                 '--depth',
                 '1',
                 '--no-single-branch',
                 repo_url,
                 str(target_dir),
             ],
-            check=True,
         )
 
-    def fetch_ref(self, repo_path: Path, ref: str) -> None:
-        self._run_git_command(
-            ['git', 'fetch', '--depth', '1', 'origin', ref],
+    def archive_paths(
+        self, repo_url: str, ref: str, paths: Sequence[str], target_dir: Path
+    ) -> None:
+        """
+        Stream only the requested paths at ref via `git archive --remote`.
+
+        Raises CalledProcessError when the remote refuses upload-archive
+        (e.g. GitHub) or a path does not exist at ref.
+        """
+        import tarfile
+
+        args = ['git', 'archive', '--format=tar', f'--remote={repo_url}', ref, '--']
+        args.extend(paths)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        # Strip absolute paths, links outside the target, etc. where supported
+        extract_kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+        proc = subprocess.Popen(
+            args,
+            cwd=self.work_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            with tarfile.open(fileobj=proc.stdout, mode='r|') as archive:
+                archive.extractall(target_dir, **extract_kwargs)
+            extracted = True
+        except tarfile.TarError:
+            extracted = False
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read().decode(errors='replace')
+            proc.stderr.close()
+            returncode = proc.wait()
+
+        if returncode != 0 or not extracted:
+            raise subprocess.CalledProcessError(returncode, args, stderr=stderr)
+
+    def clone_sparse(
+        self,
+        repo_url: str,
+        ref: str,
+        target_dir: Path,
+        paths: Sequence[str],
+        quiet: bool = True,
+    ) -> None:
+        """Blobless shallow clone that only materializes the requested paths."""
+        self._run_git_noisy(
+            [
+                'git',
+                'clone',
+                *_quiet_flag(quiet),
+                '--filter=blob:none',
+                '--no-checkout',
+                '--depth',
+                '1',
+                '--branch',
+                ref,
+                repo_url,
+                str(target_dir),
+            ],
+        )
+        self.set_sparse_paths(target_dir, paths)
+        self.checkout_ref(target_dir, ref)
+
+    def set_sparse_paths(self, repo_path: Path, paths: Sequence[str]) -> None:
+        """
+        Limit the checkout to exactly the given paths.
+
+        Non-cone patterns are used because cone mode only matches directories.
+        """
+        patterns = ['/' + _escape_sparse_pattern(path.lstrip('/')) for path in paths]
+        self._run_git_noisy(
+            ['git', 'sparse-checkout', 'set', '--no-cone', *patterns],
             cwd=repo_path,
-            check=True,
         )
 
+    def fetch_commit(
+        self,
+        repo_url: str,
+        sha: str,
+        target_dir: Path,
+        paths: Optional[Sequence[str]] = None,
+        quiet: bool = True,
+    ) -> None:
+        """
+        Fetch a single commit into a fresh repo and check it out.
+
+        `git clone --branch` can't take a SHA, so this skips the clone and
+        asks the remote for just that commit (blobless, depth 1). When paths
+        are given only those are materialized, as in clone_sparse.
+        """
+        target_dir.mkdir(parents=True, exist_ok=True)
+        self._run_git_noisy(['git', 'init', *_quiet_flag(quiet)], cwd=target_dir)
+        self._run_git_noisy(
+            ['git', 'remote', 'add', 'origin', repo_url], cwd=target_dir
+        )
+        self._run_git_noisy(
+            [
+                'git',
+                'fetch',
+                *_quiet_flag(quiet),
+                '--depth',
+                '1',
+                '--filter=blob:none',
+                'origin',
+                sha,
+            ],
+            cwd=target_dir,
+        )
+        if paths:
+            self.set_sparse_paths(target_dir, paths)
+        self.checkout_ref(target_dir, 'FETCH_HEAD')
+
+    def fetch_ref(self, repo_path: Path, ref: str, quiet: bool = True) -> None:
+        self._run_git_noisy(
+            ['git', 'fetch', *_quiet_flag(quiet), '--depth', '1', 'origin', ref],
+            cwd=repo_path,
+        )
+
+    def fetch_history(self, repo_path: Path, quiet: bool = True) -> None:
+        # Remotes only serve full SHAs, so an abbreviated one can only be
+        # resolved locally once the commits (not blobs) are all present
+        self._run_git_noisy(
+            ['git', 'fetch', *_quiet_flag(quiet), '--unshallow', 'origin'],
+            cwd=repo_path,
+        )
+
+    def is_pinned_ref(self, repo_url: str, ref: str) -> bool:
+        """
+        Whether ref names a fixed commit on the remote: a tag, or a SHA that
+        isn't also a branch name. False if the remote can't be queried.
+        """
+        output = self._run_git_check_output(
+            ['git', 'ls-remote', repo_url, f'refs/tags/{ref}', f'refs/heads/{ref}']
+        )
+        if output is None:
+            return False
+        if 'refs/tags/' in output:
+            return True
+        return 'refs/heads/' not in output and bool(COMMIT_SHA_RE.fullmatch(ref))
+
     def checkout_ref(self, repo_path: Path, ref: str) -> None:
-        self._run_git_command(
+        self._run_git_noisy(
             ['git', 'checkout', ref],
             cwd=repo_path,
-            check=True,
         )
 
-    def clone_repo(self, repo_url: str, ref: str, work_dir: Path) -> Path:
+    def _new_repo_dir(self, work_dir: Path, use_cache: bool) -> Path:
         """
-        Clone repository with fallback strategy for different ref types.
+        Directory for one clone attempt.
 
-        First tries cloning with branch/tag (works for branches and tags).
-        If that fails, falls back to shallow clone + fetch + checkout
-        (works for commit SHAs or tags on other branches).
+        Cached work dirs persist across runs, so a fixed path is reused and
+        cleared. Otherwise each attempt gets a fresh mkdtemp() subdirectory
+        and the caller's temporary work_dir removes everything once.
         """
+        if not use_cache:
+            import tempfile
 
-        repo_dir = work_dir / 'source_repo'
+            return Path(tempfile.mkdtemp(prefix='src_', dir=work_dir))
 
-        # Remove existing directory if present
+        repo_dir = work_dir / 'source_repo'
         if repo_dir.exists():
-            import shutil
-
             shutil.rmtree(repo_dir)
+        return repo_dir
+
+    def clone_repo(
+        self,
+        repo_url: str,
+        ref: str,
+        work_dir: Path,
+        paths: Optional[Sequence[str]] = None,
+        use_cache: bool = False,
+    ) -> Path:
+        """
+        Clone repository with fallback strategy for different ref types.
+
+        When paths are given, first tries `git archive --remote` and then a
+        blobless sparse clone so only the requested files are transferred.
+        Commit SHAs are fetched directly (see fetch_commit) before any clone.
+        Otherwise (or if both fail) tries cloning with branch/tag (works for
+        branches and tags). If that fails, falls back to shallow clone +
+        fetch + checkout (works for tags on other branches, and for
+        abbreviated SHAs by fetching the full commit history).
+        """
+
+        if paths:
+            repo_dir = self._new_repo_dir(work_dir, use_cache)
+            try:
+                self.archive_paths(repo_url, ref, paths, repo_dir)
+                return repo_dir
+            except subprocess.CalledProcessError:
+                # Remote doesn't allow upload-archive; try a sparse clone
+                pass
+
+        if COMMIT_SHA_RE.fullmatch(ref):
+            # Clones by branch/tag can't succeed for a SHA; fetch it directly
+            repo_dir = self._new_repo_dir(work_dir, use_cache)
+            try:
+                self.fetch_commit(repo_url, ref, repo_dir, paths)
+                return repo_dir
+            except subprocess.CalledProcessError:
+                # Abbreviated SHA, or the remote refuses fetching by SHA
+                pass
+
+        if paths:
+            repo_dir = self._new_repo_dir(work_dir, use_cache)
+            try:
+                self.clone_sparse(repo_url, ref, repo_dir, paths)
+                return repo_dir
+            except subprocess.CalledProcessError:
+                # Old git without sparse-checkout, or ref is a commit SHA
+                pass
 
         # First, try cloning with branch/tag (works for branches and tags)
+        repo_dir = self._new_repo_dir(work_dir, use_cache)
         try:
             self.clone_with_branch(repo_url, ref, repo_dir)
             return repo_dir
         except subprocess.CalledProcessError:
             # If that fails, it might be a commit SHA
             # Clone with --no-single-branch to allow fetching any ref
+            repo_dir = self._new_repo_dir(work_dir, use_cache)
             try:
                 self.clone_shallow(repo_url, repo_dir)
-                # Fetch the specific ref (might be a commit SHA or tag on another branch)
-                self.fetch_ref(repo_dir, ref)
+                if COMMIT_SHA_RE.fullmatch(ref):
+                    # Abbreviated SHA, or a remote that refuses fetching by SHA
+                    self.fetch_history(repo_dir)
+                else:
+                    # Might be a tag on another branch
+                    self.fetch_ref(repo_dir, ref)
                 # Checkout the ref
                 self.checkout_ref(repo_dir, ref)
             except subprocess.CalledProcessError as e:
@@ -209,3 +398,16 @@ class GitRepository:
                 ) from e
 
         return repo_dir
+
+
+def _quiet_flag(quiet: bool) -> List[str]:
+    # Stop git from formatting progress output nobody reads; errors still
+    # reach stderr
+    return ['--quiet'] if quiet else []
+
+
+def _escape_sparse_pattern(path: str) -> str:
+    """Escape gitignore glob characters so a path only matches itself."""
+    for char in ('\\', '*', '?', '['):
+        path = path.replace(char, '\\' + char)
+    return path
@@ -1,160 +1,223 @@
 import hashlib
+import mmap
+import os
+import posixpath
 import shutil
-import tempfile
-import tomllib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from precommit_sync_files.exceptions import (
-    ConfigError,
-    FileComparisonError,
+try:
+    from blake3 import blake3
+except ImportError:  # optional, see the 'fast' extra
+    blake3 = None
+
+from precommit_sync_files.cache import file_lock, prune_source_cache, source_cache_dir
+from precommit_sync_files.config import (  # noqa: F401 (re-exported)
+    MISSING_FILE_ERRORS,
+    find_config_file,
+    get_hook_version,
+    load_config,
 )
-from precommit_sync_files.git_repo import GitRepository
+from precommit_sync_files.exceptions import FileComparisonError
+from precommit_sync_files.git_repo import COMMIT_SHA_RE, GitRepository
 
+T = TypeVar('T')
+R = TypeVar('R')
 
-def load_config(config_path: Optional[Path] = None) -> Dict:
-    if config_path is None:
-        config_path = find_config_file()
+# Written to a cache entry's .complete marker when its ref is a remote tag or
+# an abbreviated SHA
+PINNED_MARKER = 'pinned'
 
-    if config_path is None or not config_path.exists():
-        raise ConfigError(
-            '.sync-files.toml not found. The hook is a no-op if config is missing.'
-        )
+# Per-file work is I/O bound (hashlib releases the GIL), so threads scale
+MAX_WORKERS = 32
 
-    try:
-        with open(config_path, 'rb') as f:
-            config = tomllib.load(f)
-    except ValueError as e:
-        # tomllib raises ValueError for TOML decode errors
-        raise ConfigError(f'Failed to parse .sync-files.toml: {e}') from e
-    except Exception as e:
-        raise ConfigError(f'Failed to read .sync-files.toml: {e}') from e
-
-    # Validate required fields
-    if not isinstance(config, dict):
-        raise ConfigError('Configuration must be a TOML table')
-
-    if 'source' not in config:
-        raise ConfigError('Missing required field: source')
-    if not isinstance(config['source'], dict):
-        raise ConfigError("Field 'source' must be a dictionary")
-    if 'repo' not in config['source']:
-        raise ConfigError('Missing required field: source.repo')
-    if 'ref' not in config['source']:
-        raise ConfigError('Missing required field: source.ref')
-
-    if 'files' not in config:
-        raise ConfigError('Missing required field: files')
-    if not isinstance(config['files'], list):
-        raise ConfigError("Field 'files' must be a list")
-    if len(config['files']) == 0:
-        raise ConfigError("Field 'files' must contain at least one file mapping")
-
-    for i, file_entry in enumerate(config['files']):
-        if not isinstance(file_entry, dict):
-            raise ConfigError(f'files[{i}] must be a dictionary')
-        if 'src' not in file_entry:
-            raise ConfigError(f'files[{i}] missing required field: src')
-        if 'dst' not in file_entry:
-            raise ConfigError(f'files[{i}] missing required field: dst')
-
-    # Set default options
-    if 'options' not in config:
-        config['options'] = {}
-    if 'mode' not in config['options']:
-        config['options']['mode'] = 'check'
-
-    if config['options']['mode'] not in ('check', 'write'):
-        raise ConfigError("options.mode must be 'check' or 'write'")
-
-    # When running as a pre-commit hook, override the ref with the hook's own version
-    # This ensures files are fetched from the same tag/version as the hook itself
-    hook_version = get_hook_version()
-    if hook_version is not None:
-        config['source']['ref'] = hook_version
-
-    return config
-
-
-def find_config_file() -> Optional[Path]:
-    current = Path.cwd()
-    while current != current.parent:
-        config_path = current / '.sync-files.toml'
-        if config_path.exists():
-            return config_path
-        current = current.parent
-    return None
-
-
-def get_hook_version() -> Optional[str]:
-    try:
-        # Get the directory where this module is located
-        module_file = Path(__file__).resolve()
-        module_path_str = str(module_file)
 
-        # Check if we're in a pre-commit cache directory
-        # Pre-commit cache paths typically contain ".cache/pre-commit"
-        if '.cache/pre-commit' not in module_path_str:
-            return None
+def _map_parallel(func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+    """Map func over items in a thread pool, preserving order."""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(func, items))
 
-        # Find the repository root by walking up from the module file
-        # Pre-commit cache structure:
-        # ~/.cache/pre-commit/<repohash>/<repohash>/ (the actual repo checkout)
-        # or
-        # ~/.cache/pre-commit/<repohash>/py_env-*/lib/python*/site-packages/ (if installed as package)
-        git_repo = GitRepository()
-        repo_root = git_repo.find_repo_root(module_file.parent)
 
-        if repo_root is None:
-            return None
+def fetch_source_repo(
+    repo_url: str,
+    ref: str,
+    work_dir: Path,
+    paths: Optional[List[str]] = None,
+    use_cache: bool = False,
+) -> Path:
+    git_repo = GitRepository()
+    return git_repo.clone_repo(repo_url, ref, work_dir, paths, use_cache)
+
+
+def is_immutable_ref(ref: str) -> bool:
+    """Only a full commit SHA can't be a branch that moves."""
+    return len(ref) == 40 and COMMIT_SHA_RE.fullmatch(ref) is not None
+
+
+@contextmanager
+def cached_source_repo(repo_url: str, ref: str, paths: List[str]) -> Iterator[Path]:
+    """
+    Yield a source checkout reused across runs from the on-disk cache.
+
+    Full commit SHAs, and tags or abbreviated SHAs found on the remote when
+    the entry was fetched, are reused as-is; branches are refreshed with a
+    shallow fetch. The cache entry stays locked while the
+    caller reads from it. Fetching a new entry prunes entries unused for
+    SOURCE_CACHE_MAX_AGE. If the cache directory is not writable, a
+    temporary checkout is used instead.
+    """
+    work_dir = source_cache_dir(repo_url, ref, paths)
+    complete_marker = work_dir / '.complete'
+
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(file_lock(work_dir.with_suffix('.lock')))
+            work_dir.mkdir(parents=True, exist_ok=True)
+            cache_writable = True
+        except OSError:
+            cache_writable = False
+
+        # Yield outside the except block so later errors aren't chained onto it
+        if not cache_writable:
+            import tempfile
+
+            temp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            yield fetch_source_repo(repo_url, ref, Path(temp_dir), paths)
+            return
+
+        repo_dir = work_dir / 'source_repo'
+        if complete_marker.exists() and not _refresh_cached_repo(
+            repo_dir, ref, complete_marker
+        ):
+            complete_marker.unlink()
+
+        if complete_marker.exists():
+            # Mark the entry as recently used so it isn't pruned
+            complete_marker.touch()
+        else:
+            repo_dir = fetch_source_repo(repo_url, ref, work_dir, paths, use_cache=True)
+            # Remember tags and abbreviated SHAs so reuse needs no network
+            pinned = not is_immutable_ref(ref) and GitRepository().is_pinned_ref(
+                repo_url, ref
+            )
+            complete_marker.write_text(PINNED_MARKER if pinned else '')
+            # A new entry usually means the pinned ref changed, so older
+            # entries may now be unused
+            prune_source_cache(keep=work_dir)
+
+        yield repo_dir
+
+
+def _refresh_cached_repo(repo_dir: Path, ref: str, complete_marker: Path) -> bool:
+    """Bring a cached checkout up to date; False if it must be re-fetched."""
+    if is_immutable_ref(ref) or complete_marker.read_text() == PINNED_MARKER:
+        return True
+    if not (repo_dir / '.git').exists():
+        # Archive extractions can't be updated in place
+        return False
 
-        # Get version using GitRepository
-        return git_repo.get_version(repo_root)
-    except Exception:
-        # If anything goes wrong, return None (fall back to config file ref)
-        pass
+    git_repo = GitRepository()
+    try:
+        git_repo.fetch_ref(repo_dir, ref)
+        git_repo.checkout_ref(repo_dir, 'FETCH_HEAD')
+    except subprocess.CalledProcessError:
+        return False
+    return True
 
-    return None
 
+def resolve_hash_name(requested: Optional[str]) -> str:
+    """
+    Pick the hash used for comparisons.
 
-def fetch_source_repo(repo_url: str, ref: str, work_dir: Path) -> Path:
-    git_repo = GitRepository()
-    return git_repo.clone_repo(repo_url, ref, work_dir)
+    Only equality matters (both sides use the same algorithm), so BLAKE3 is
+    preferred when installed and SHA-256 is the fallback.
+    """
+    if requested == 'sha256' or blake3 is None:
+        return 'sha256'
+    return 'blake3'
 
 
-def compute_file_hash(file_path: Path) -> str:
+def compute_file_hash(file_path: Union[str, Path], hash_name: str = 'sha256') -> str:
     try:
+        if hash_name == 'blake3' and blake3 is not None:
+            # Maps the file and hashes it in Rust, no Python buffers at all
+            return blake3().update_mmap(file_path).hexdigest()
         with open(file_path, 'rb') as f:
-            content = f.read()
-        return hashlib.sha256(content).hexdigest()
+            # Hash straight from the page cache in a single C call
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return hashlib.sha256(mm).hexdigest()
+            except ValueError:
+                pass  # empty or unmappable file
+            # Stream through the digest instead of reading the whole file
+            return hashlib.file_digest(f, hashlib.sha256).hexdigest()
     except IOError as e:
         raise FileComparisonError(f'Failed to read file {file_path}: {e}') from e
 
 
 def compare_files(
-    source_file: Path, dest_file: Path, repo_root: Path
+    source_path: str,
+    dest_path: str,
+    source_file: str,
+    dest_file: str,
+    src_hashes: Optional[Dict[str, str]] = None,
+    hash_name: str = 'sha256',
 ) -> Tuple[bool, Optional[str]]:
-    source_path = source_file
-    dest_path = repo_root / dest_file
-
-    # Check if source file exists
-    if not source_path.exists():
+    """
+    Compare two absolute paths by size, then by hash.
+
+    source_file and dest_file are the configured src and dst, used in
+    messages. Sources don't change during a run, so when src_hashes is given
+    a src mapped to several dsts is only hashed once. Concurrent misses may
+    hash twice, which is harmless.
+    """
+    # One stat per side gives both existence and size
+    try:
+        source_size = os.stat(source_path).st_size
+    except MISSING_FILE_ERRORS:
         return (
             False,
             f'Source file {source_file} does not exist in source repository',
         )
 
-    # Check if destination file exists
-    if not dest_path.exists():
+    try:
+        dest_size = os.stat(dest_path).st_size
+    except MISSING_FILE_ERRORS:
         return (
             False,
             f'Destination file {dest_file} does not exist in consuming repository',
         )
 
-    # Compare hashes
+    # Files of different sizes can't match; skip hashing them
+    if source_size != dest_size:
+        return (
+            False,
+            f'File {dest_file} differs from source (size {source_size} vs {dest_size})',
+        )
+
     try:
-        source_hash = compute_file_hash(source_path)
-        dest_hash = compute_file_hash(dest_path)
+        source_hash = None if src_hashes is None else src_hashes.get(source_path)
+        if source_hash is None:
+            source_hash = compute_file_hash(source_path, hash_name)
+            if src_hashes is not None:
+                src_hashes[source_path] = source_hash
+        dest_hash = compute_file_hash(dest_path, hash_name)
     except FileComparisonError as e:
         return (False, str(e))
 
@@ -167,14 +230,15 @@ def compare_files(
     )
 
 
-def sync_file(source_file: Path, dest_file: Path, repo_root: Path) -> None:
-    dest_path = repo_root / dest_file
-
+def sync_file(source_file: Path, dest_path: str) -> None:
     # Create parent directories if needed
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
     try:
-        shutil.copy2(source_file, dest_path)
+        # copyfile uses the kernel fast path (sendfile/copy_file_range); only
+        # the permission bits are carried over, not timestamps or xattrs
+        shutil.copyfile(source_file, dest_path)
+        shutil.copymode(source_file, dest_path)
     except (IOError, OSError) as e:
         raise FileComparisonError(
             f'Failed to copy {source_file} to {dest_path}: {e}'
@@ -190,7 +254,13 @@ def sync_files(
     repo_url = config['source']['repo']
     ref = config['source']['ref']
     files = config['files']
+    # Normalized once so e.g. './a.txt' names the same path in the archive
+    # args, sparse patterns, cache key and the fetched tree
+    srcs = [posixpath.normpath(file_entry['src']) for file_entry in files]
+    # Only the configured sources need to be fetched from the source repo
+    src_paths = list(dict.fromkeys(srcs))
     mode = config['options']['mode']
+    hash_name = resolve_hash_name(config['options'].get('hash'))
 
     # Use write_mode if explicitly set, otherwise use config mode
     should_write = write_mode or (mode == 'write')
@@ -198,35 +268,58 @@ def sync_files(
     errors = []
     warnings = []
 
-    # Create temporary directory for source repo
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-        source_repo = fetch_source_repo(repo_url, ref, temp_path)
-
+    # Reuse the cached source checkout across runs
+    with cached_source_repo(repo_url, ref, src_paths) as source_repo:
         mismatches = []
+        # Absolute destinations are joined once and reused for compare and write
+        dst_root = str(repo_root)
+        entries = [
+            (src, file_entry['dst'], os.path.join(dst_root, file_entry['dst']))
+            for src, file_entry in zip(srcs, files, strict=True)
+        ]
+
+        src_root = str(source_repo)
+        src_hashes: Dict[str, str] = {}
+        results = _map_parallel(
+            lambda entry: compare_files(
+                os.path.join(src_root, entry[0]),
+                entry[2],
+                entry[0],
+                entry[1],
+                src_hashes,
+                hash_name,
+            ),
+            entries,
+        )
 
-        for file_entry in files:
-            src_path = file_entry['src']
-            dst_path = file_entry['dst']
-
-            source_file = source_repo / src_path
-            are_equal, diff_msg = compare_files(source_file, Path(dst_path), repo_root)
-
+        for (src, dst, dest_path), (are_equal, diff_msg) in zip(
+            entries, results, strict=True
+        ):
             if not are_equal:
-                mismatches.append((source_file, dst_path, diff_msg))
+                mismatches.append((source_repo / src, dest_path, dst, diff_msg))
 
         if mismatches:
             if should_write:
                 # Write mode: overwrite files
-                for source_file, dst_path, diff_msg in mismatches:
+                def write_mismatch(mismatch: Tuple) -> Optional[str]:
+                    source_file, dest_path, _dst_path, _diff_msg = mismatch
                     try:
-                        sync_file(source_file, Path(dst_path), repo_root)
-                        warnings.append(f'Synced {dst_path}: {diff_msg}')
+                        sync_file(source_file, dest_path)
                     except FileComparisonError as e:
-                        errors.append(str(e))
+                        return str(e)
+                    return None
+
+                write_errors = _map_parallel(write_mismatch, mismatches)
+                for (_source_file, _dest_path, dst_path, diff_msg), error in zip(
+                    mismatches, write_errors, strict=True
+                ):
+                    if error is None:
+                        warnings.append(f'Synced {dst_path}: {diff_msg}')
+                    else:
+                        errors.append(error)
             else:
                 # Check mode: fail with errors
-                for _source_file, dst_path, diff_msg in mismatches:
+                for _source_file, _dest_path, dst_path, diff_msg in mismatches:
                     errors.append(f'{dst_path}: {diff_msg}')
 
     return errors, warnings
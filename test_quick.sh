@@ -225,6 +225,345 @@ test_write_mode() {
     echo ""
 }
 
+count_cache_entries() {
+    local cache_dir="$1"
+    find "$cache_dir/precommit-sync-files/sources" -mindepth 1 -maxdepth 1 -type d | wc -l
+}
+
+# The only source checkout in the cache
+cached_checkout() {
+    local cache_dir="$1"
+    echo "$cache_dir"/precommit-sync-files/sources/*/source_repo
+}
+
+readonly GIT_ID="-c user.name=test -c user.email=test@example.com"
+
+# Local source repo with common.txt committed on main
+create_source_repo() {
+    local src_repo="$1"
+    run_cmd "git init -b main '$src_repo'" true
+    echo "v1" > "$src_repo/common.txt"
+    run_cmd "git -C '$src_repo' add common.txt" true
+    run_cmd "git $GIT_ID -C '$src_repo' commit -m v1" true
+}
+
+# Commit new content for common.txt on the checked-out branch
+update_source_repo() {
+    local src_repo="$1"
+    local content="$2"
+    echo "$content" > "$src_repo/common.txt"
+    run_cmd "git $GIT_ID -C '$src_repo' commit -am '$content'" true
+}
+
+# Consumer repo syncing common.txt (plus any extra [[files]] src values)
+create_consumer_repo() {
+    local consumer="$1"
+    local src_repo="$2"
+    local ref="$3"
+    shift 3
+
+    mkdir -p "$consumer"
+    setup_git_repo "$consumer"
+    cat > "$consumer/.sync-files.toml" << EOF
+[source]
+repo = "file://$src_repo"
+ref = "$ref"
+
+[[files]]
+src = "common.txt"
+dst = "common.txt"
+EOF
+    local extra
+    for extra in "$@"; do
+        cat >> "$consumer/.sync-files.toml" << EOF
+
+[[files]]
+src = "$extra"
+dst = "$(basename "$extra")"
+EOF
+    done
+}
+
+test_source_cache() {
+    log_info "7️⃣  Testing source cache reuse and refresh..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    create_source_repo "$src_repo"
+    create_consumer_repo "$consumer" "$src_repo" main
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_success "uv run sync-common-files --write" "Initial sync failed"
+    assert_success "uv run sync-common-files" "Check after sync failed"
+    if [[ "$(count_cache_entries "$cache_dir")" -eq 1 ]]; then
+        log_success "Cache entry reused across runs"
+    else
+        log_error "Expected exactly one cache entry"
+        exit 1
+    fi
+
+    # git archive extracts have no .git, so a branch entry is re-fetched
+    update_source_repo "$src_repo" v2
+    assert_failure "uv run sync-common-files" \
+        "Cached branch was not refreshed (drift not detected)"
+    assert_success "uv run sync-common-files --write" "Sync after refresh failed"
+    if grep -q "v2" common.txt && [[ "$(count_cache_entries "$cache_dir")" -eq 1 ]]; then
+        log_success "Cached archive entry re-fetched"
+    else
+        log_error "Refreshed content was not synced"
+        exit 1
+    fi
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+# A missing src makes git archive fail, forcing a sparse clone; the checkout
+# must be refreshed in place rather than re-fetched
+assert_refreshed_in_place() {
+    local src_repo="$1"
+    local cache_dir="$2"
+    local checkout
+    checkout=$(cached_checkout "$cache_dir")
+
+    if [[ ! -d "$checkout/.git" ]]; then
+        log_error "Expected a git checkout in the cache, not an archive extract"
+        exit 1
+    fi
+    touch "$checkout/.git/sentinel"
+
+    update_source_repo "$src_repo" v2
+    assert_failure "uv run sync-common-files --write" \
+        "Sync should report the missing source file"
+    if grep -q "v2" common.txt && [[ -e "$checkout/.git/sentinel" ]] \
+        && [[ "$(count_cache_entries "$cache_dir")" -eq 1 ]]; then
+        return 0
+    fi
+    log_error "Cached checkout was not refreshed in place"
+    exit 1
+}
+
+test_sparse_cache_refresh() {
+    log_info "8️⃣  Testing in-place refresh of a sparse checkout..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    create_source_repo "$src_repo"
+    create_consumer_repo "$consumer" "$src_repo" main absent.txt
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_failure "uv run sync-common-files --write" \
+        "Sync should report the missing source file"
+    assert_refreshed_in_place "$src_repo" "$cache_dir"
+    log_success "Cached branch checkout refreshed in place"
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+test_version_branch_refresh() {
+    log_info "9️⃣  Testing refresh of a version-shaped branch..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    # A branch named like a version must not be treated as a pinned tag
+    create_source_repo "$src_repo"
+    run_cmd "git -C '$src_repo' checkout -b 3.12" true
+    create_consumer_repo "$consumer" "$src_repo" 3.12 absent.txt
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_failure "uv run sync-common-files --write" \
+        "Sync should report the missing source file"
+    assert_refreshed_in_place "$src_repo" "$cache_dir"
+    log_success "Version-shaped branch refreshed in place"
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+test_normalized_src_paths() {
+    log_info "🔟 Testing ./-prefixed and doubled-slash src paths..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    create_source_repo "$src_repo"
+    mkdir -p "$src_repo/sub"
+    echo "echo tool" > "$src_repo/sub/tool.sh"
+    run_cmd "git -C '$src_repo' add sub/tool.sh" true
+    run_cmd "git $GIT_ID -C '$src_repo' commit -m tool" true
+    create_consumer_repo "$consumer" "$src_repo" main ./sub//tool.sh
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_success "uv run sync-common-files --write" "Sync with ./ src failed"
+    assert_success "uv run sync-common-files" "Check with ./ src failed"
+    if grep -q "echo tool" tool.sh; then
+        log_success "Normalized src paths synced"
+    else
+        log_error "tool.sh was not synced from ./sub//tool.sh"
+        exit 1
+    fi
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+test_missing_src() {
+    log_info "1️⃣1️⃣ Testing a src missing from the source repo..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    create_source_repo "$src_repo"
+    create_consumer_repo "$consumer" "$src_repo" main absent.txt
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    # git archive fails on the missing path, so the sparse clone must still
+    # fetch the files that do exist
+    local output
+    output=$(uv run sync-common-files 2>&1) && {
+        log_error "Check should fail when a src is missing"
+        exit 1
+    }
+    if ! grep -q "Source file absent.txt does not exist in source repository" <<< "$output"; then
+        log_error "Missing src was not reported"
+        exit 1
+    fi
+    if ! grep -q "Destination file common.txt does not exist" <<< "$output"; then
+        log_error "Existing src was not compared after the archive fallback"
+        exit 1
+    fi
+    if [[ ! -d "$(cached_checkout "$cache_dir")/.git" ]]; then
+        log_error "Expected the sparse clone fallback after git archive failed"
+        exit 1
+    fi
+    log_success "Missing src reported; other files still compared"
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+test_full_sha_ref() {
+    log_info "1️⃣2️⃣ Testing a full commit SHA ref..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    # Pin a commit that is no longer a branch tip; git archive refuses
+    # unadvertised SHAs, so this goes through a direct fetch by SHA
+    create_source_repo "$src_repo"
+    echo "other" > "$src_repo/other.txt"
+    run_cmd "git -C '$src_repo' add other.txt" true
+    run_cmd "git $GIT_ID -C '$src_repo' commit -m other" true
+    local sha
+    sha=$(git -C "$src_repo" rev-parse HEAD)
+    update_source_repo "$src_repo" v2
+    create_consumer_repo "$consumer" "$src_repo" "$sha"
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_success "uv run sync-common-files --write" "Sync at full SHA failed"
+    assert_success "uv run sync-common-files" "Check at full SHA failed"
+    local checkout
+    checkout=$(cached_checkout "$cache_dir")
+    if ! grep -q "v1" common.txt; then
+        log_error "Synced content does not match the pinned SHA"
+        exit 1
+    fi
+    if [[ ! -d "$checkout/.git" || -e "$checkout/other.txt" ]] \
+        || ! git -C "$checkout" sparse-checkout list | grep -q "common.txt"; then
+        log_error "Expected a sparse checkout of only the configured files"
+        exit 1
+    fi
+    log_success "Full SHA fetched directly into a sparse checkout"
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
+test_abbreviated_sha_ref() {
+    log_info "1️⃣3️⃣ Testing an abbreviated commit SHA ref..."
+
+    local test_dir
+    test_dir=$(create_test_directory)
+    local src_repo="$test_dir/source"
+    local consumer="$test_dir/consumer"
+    local cache_dir="$test_dir/cache"
+
+    # Remotes can't fetch abbreviated SHAs, so every fetch step fails until
+    # the full-history fallback resolves it locally
+    create_source_repo "$src_repo"
+    local sha
+    sha=$(git -C "$src_repo" rev-parse --short=10 HEAD)
+    update_source_repo "$src_repo" v2
+    create_consumer_repo "$consumer" "$src_repo" "$sha"
+
+    cd "$consumer"
+    export XDG_CACHE_HOME="$cache_dir"
+
+    assert_success "uv run sync-common-files --write" "Sync at abbreviated SHA failed"
+    if grep -q "v1" common.txt; then
+        log_success "Abbreviated SHA resolved by the fallback clone"
+    else
+        log_error "Synced content does not match the abbreviated SHA"
+        exit 1
+    fi
+
+    # The entry is pinned, so later runs must not repeat the fallback clone
+    local checkout
+    checkout=$(cached_checkout "$cache_dir")
+    touch "$checkout/.git/sentinel"
+    assert_success "uv run sync-common-files" "Check at abbreviated SHA failed"
+    if [[ -e "$checkout/.git/sentinel" ]]; then
+        log_success "Abbreviated SHA reused from the cache"
+    else
+        log_error "Abbreviated SHA was re-fetched on a later run"
+        exit 1
+    fi
+
+    unset XDG_CACHE_HOME
+    cleanup_test_directory "$test_dir"
+    echo ""
+}
+
 # ============================================================================
 # Main Test Runner
 # ============================================================================
@@ -246,6 +585,14 @@ run_all_tests() {
 
     # Cleanup
     cleanup_test_directory "$test_dir"
+
+    test_source_cache
+    test_sparse_cache_refresh
+    test_version_branch_refresh
+    test_normalized_src_paths
+    test_missing_src
+    test_full_sha_ref
+    test_abbreviated_sha_ref
 }
 
 # ============================================================================